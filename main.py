@@ -1,15 +1,29 @@
 import os
+import sys
+import io
+import csv
 import sqlite3
 import json
-from typing import Optional, Dict, Union, Any
+import re
+import logging
+import atexit
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from itertools import groupby
+from operator import itemgetter
+from typing import Optional, Dict, Tuple, Union, Any
 from openai import OpenAI
 from dotenv import load_dotenv
+from semantic_cache import SemanticCache
 from utils import (
     get_db_connection,
     load_csv_to_db,
     execute_query,
+    limit_query,
+    is_read_query,
     list_tables,
-    get_table_schema
+    QUERY_ROW_LIMIT
 )
 
 # Load environment variables
@@ -21,51 +35,31 @@ client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 if not os.getenv("OPENAI_API_KEY"):
     raise ValueError("OPENAI_API_KEY not found in environment variables. Please check your .env file.")
 
-def get_schema_description(conn: sqlite3.Connection) -> str:
-    """Get a formatted description of all table schemas."""
-    tables = list_tables(conn)
-    schemas = {}
-    for table in tables:
-        schemas[table] = get_table_schema(conn, table)
-    
-    return "\n".join([
-        f"""- {table} ({', '.join([f"{col['name']} ({col['type']})" for col in cols])})"""
-        for table, cols in schemas.items()
-    ])
-
-def process_natural_language(question: str, conn: sqlite3.Connection) -> Dict[str, Any]:
-    """Process natural language input and determine intent and action."""
-    try:
-        schema_desc = get_schema_description(conn)
-        
-        # Create prompt with examples and intent descriptions
-        prompt = f"""You are an AI assistant helping users interact with a spreadsheet database. Based on the user's input, either:
+# Static instructions and examples, kept byte-identical so OpenAI's prefix cache can hit
+SYSTEM_PROMPT_STATIC = """You are a database assistant helping users interact with a spreadsheet database. Based on the user's input, either:
 1. Return a command intent in JSON format
 2. Generate an SQL query for data questions
 
-Available tables and their schemas:
-{schema_desc}
-
 Intent examples:
 1. List Tables Intent:
    - "Show me the tables"
    - "What tables are loaded?"
    - "Display database structure"
    - "Which tables do I have?"
-   Response: {{"intent": "list_tables"}}
+   Response: {"intent": "list_tables"}
 
 2. Load File Intent:
    - "Upload my data file"
    - "Load sales.csv"
    - "Import the CSV file"
    - "Can you load customer_data.csv?"
-   Response: {{"intent": "load_csv", "filename": "<filename>"}}
+   Response: {"intent": "load_csv", "filename": "<filename>"}
 
 3. Exit Intent:
    - "Quit"
    - "Exit"
    - "Bye"
-   Response: {{"intent": "exit"}}
+   Response: {"intent": "exit"}
 
 4. Data Query Intent (return SQL):
    - "Show total revenue this month"
@@ -74,38 +68,194 @@ Intent examples:
    - "Display sales by region"
    Response: <appropriate SQL query>
 
-User input: "{question}"
-
+The user message lists the available tables and their schemas, followed by the user input after "Q:".
 If the input matches a command intent (list_tables, load_csv, exit), return a JSON response.
 If it's a data query, return only the SQL query without any JSON formatting.
 """
 
-        # Get response from OpenAI using new client-based approach
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a database assistant that returns either JSON command intents or SQL queries."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=150
-        )
-        
-        result = response.choices[0].message.content.strip()
-        
-        # Try to parse as JSON first
+PROMPT_CACHE_KEY = "sql-assistant-v1"
+
+# Plain commands that can be recognized locally without a round-trip to the LLM
+_CMD_RE = re.compile(r'^\s*(quit|exit|bye|goodbye)\s*[.!]?\s*$', re.I)
+_LOAD_RE = re.compile(r'\b(?:load|import)\s+([\w./-]+\.csv)\b', re.I)
+_LIST_RE = re.compile(r'^\s*(show|list|display)(\s+(me|all|the|my))*\s+tables?\s*[.?!]?\s*$', re.I)
+
+def classify_command(question: str) -> Optional[Dict[str, Any]]:
+    """Return the intent for a plain command, or None if the input needs the LLM."""
+    if _CMD_RE.match(question):
+        return {"intent": "exit"}
+    if _LIST_RE.match(question):
+        return {"intent": "list_tables"}
+    match = _LOAD_RE.search(question)
+    if match:
+        return {"intent": "load_csv", "filename": match.group(1)}
+    return None
+
+# Sentence-embedding model for the semantic cache, loaded and warmed up once at startup
+try:
+    from sentence_transformers import SentenceTransformer
+    _EMBED = SentenceTransformer("all-MiniLM-L6-v2")
+    _EMBED.encode(["warm"])
+except ImportError:  # sentence-transformers is optional; the semantic cache is skipped
+    _EMBED = None
+except Exception as e:  # e.g. offline or a failed model download
+    logging.error(f"Could not load embedding model, semantic cache disabled: {str(e)}")
+    _EMBED = None
+
+# Shared pool so embedding a question overlaps with the OpenAI request
+_EXECUTOR = ThreadPoolExecutor(max_workers=2)
+
+# How long to wait for an embedding (and a possible cache hit) before calling OpenAI
+EMBED_WAIT_SECONDS = 0.05
+
+semantic_cache = SemanticCache(_EMBED)
+# Written once on exit rather than after every cache miss
+atexit.register(semantic_cache.save)
+
+# Exact-match cache of intent responses keyed on (normalized question, schema hash)
+_EXACT_CACHE: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+_EXACT_CACHE_SIZE = 2048
+
+def _remember_exact(key: tuple, intent_data: Dict[str, Any]) -> None:
+    """Store an intent response in the exact-match cache, evicting the oldest entry when full."""
+    _EXACT_CACHE[key] = intent_data
+    _EXACT_CACHE.move_to_end(key)
+    if len(_EXACT_CACHE) > _EXACT_CACHE_SIZE:
+        _EXACT_CACHE.popitem(last=False)
+
+# Last formatted schema description as (connection, PRAGMA schema_version, description).
+# Holding the connection itself (sqlite3 connections can't be weakly referenced) means
+# an identity check can't be fooled by a new connection reusing a closed one's id().
+_SCHEMA_CACHE: Optional[Tuple[sqlite3.Connection, int, str]] = None
+
+def get_schema_description(conn: sqlite3.Connection) -> str:
+    """Get a formatted description of all table schemas."""
+    global _SCHEMA_CACHE
+    # schema_version is bumped by SQLite on every DDL change, so it invalidates for us
+    version = conn.execute("PRAGMA schema_version").fetchone()[0]
+    if _SCHEMA_CACHE is not None and _SCHEMA_CACHE[0] is conn and _SCHEMA_CACHE[1] == version:
+        return _SCHEMA_CACHE[2]
+
+    # One query for every table's columns instead of a PRAGMA per table
+    rows = conn.execute(
+        "SELECT m.name, p.name, p.type FROM sqlite_master m "
+        "JOIN pragma_table_info(m.name) p "
+        "WHERE m.type='table' ORDER BY m.name, p.cid"
+    ).fetchall()
+    
+    description = "\n".join([
+        f"""- {table} ({', '.join([f"{col} ({col_type})" for _, col, col_type in cols])})"""
+        for table, cols in groupby(rows, key=itemgetter(0))
+    ])
+    _SCHEMA_CACHE = (conn, version, description)
+    return description
+
+def request_intent(question: str, schema_desc: str) -> Dict[str, Any]:
+    """Stream the model's answer, returning as soon as a JSON intent parses."""
+    # Only the schema and question vary, and they sit after the static prefix
+    stream = client.chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT_STATIC},
+            {"role": "user", "content": f"Schema:\n{schema_desc}\n\nQ: {question}"}
+        ],
+        temperature=0.3,
+        max_tokens=150,
+        stream=True,
+        extra_body={"prompt_cache_key": PROMPT_CACHE_KEY}
+    )
+
+    buffer = ""
+    is_sql = None
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content or ""
+            buffer += delta
+            if is_sql is None and buffer.strip():
+                # Command intents are JSON objects; anything else is SQL
+                is_sql = not buffer.lstrip().startswith("{")
+                if is_sql:
+                    print("\nGenerated SQL:")
+                    delta = buffer.lstrip()
+            if is_sql:
+                print(delta, end="", flush=True)
+            elif is_sql is False:
+                try:
+                    return json.loads(buffer)
+                except json.JSONDecodeError:
+                    continue
+    finally:
+        stream.close()
+
+    if is_sql:
+        print()
+    elif buffer.strip():
+        # Malformed JSON was held back while streaming; echo it like any other SQL
+        print(f"\nGenerated SQL:\n{buffer.strip()}")
+    # Fall back to treating anything unparseable as an SQL query
+    return {"intent": "generate_sql", "query": buffer.strip()}
+
+def process_natural_language(question: str, conn: sqlite3.Connection,
+                             schema_desc: Optional[str] = None) -> Dict[str, Any]:
+    """Process natural language input and determine intent and action."""
+    command = classify_command(question)
+    if command is not None:
+        return command
+
+    try:
+        if schema_desc is None:
+            schema_desc = get_schema_description(conn)
+        schema_hash = hashlib.blake2b(schema_desc.encode(), digest_size=8).hexdigest()
+
+        # Identical repeated input never needs to leave the process
+        exact_key = (question.strip().lower(), schema_hash)
+        if exact_key in _EXACT_CACHE:
+            _EXACT_CACHE.move_to_end(exact_key)
+            return _EXACT_CACHE[exact_key]
+
+        # Reuse the answer to a semantically equivalent question if we have one.
+        # A slow embedding keeps running in the pool while OpenAI is queried.
+        embed_future = _EXECUTOR.submit(semantic_cache.embed, question)
+        embedding = None
         try:
-            return json.loads(result)
-        except json.JSONDecodeError:
-            # If not JSON, assume it's an SQL query
-            return {"intent": "generate_sql", "query": result}
+            embedding = embed_future.result(timeout=EMBED_WAIT_SECONDS)
+        except FutureTimeoutError:
+            pass
+        except Exception as e:
+            # The cache is optional; a failed embedding just means no lookup
+            logging.error(f"Error embedding question: {str(e)}")
+            embed_future = None
+        if embedding is not None:
+            cached = semantic_cache.get(embedding, schema_hash)
+            if cached is not None:
+                _remember_exact(exact_key, cached)
+                return cached
+        
+        intent_data = request_intent(question, schema_desc)
+        if embedding is None and embed_future is not None:
+            try:
+                embedding = embed_future.result()
+            except Exception as e:
+                logging.error(f"Error embedding question: {str(e)}")
+
+        if intent_data.get("intent") != "error":
+            _remember_exact(exact_key, intent_data)
+            if embedding is not None:
+                semantic_cache.put(question, embedding, schema_hash, intent_data)
+
+        # Generated SQL has already been echoed while streaming
+        if intent_data.get("intent") == "generate_sql":
+            return dict(intent_data, streamed=True)
+        return intent_data
     
     except Exception as e:
         print(f"Error processing natural language: {str(e)}")
         return {"intent": "error", "message": str(e)}
 
-def handle_intent(intent_data: Dict[str, Any], conn: sqlite3.Connection) -> None:
-    """Handle different intents and execute appropriate actions."""
+def handle_intent(intent_data: Dict[str, Any], conn: sqlite3.Connection) -> bool:
+    """Handle different intents and execute appropriate actions; return True if the schema changed."""
     intent = intent_data.get("intent")
     
     if intent == "list_tables":
@@ -120,8 +270,9 @@ def handle_intent(intent_data: Dict[str, Any], conn: sqlite3.Connection) -> None
     elif intent == "load_csv":
         filename = intent_data.get("filename")
         if filename:
-            if load_csv_to_db(filename):
+            if load_csv_to_db(filename, conn=conn):
                 print(f"Successfully loaded {filename}")
+                return True
             else:
                 print(f"Failed to load {filename}")
         else:
@@ -130,14 +281,27 @@ def handle_intent(intent_data: Dict[str, Any], conn: sqlite3.Connection) -> None
     elif intent == "generate_sql":
         query = intent_data.get("query")
         if query:
-            print(f"\nGenerated SQL:\n{query}")
-            results = execute_query(conn, query)
-            if results:
+            if not intent_data.get("streamed"):
+                print(f"\nGenerated SQL:\n{query}")
+            columns, rows = execute_query(conn, query)
+            truncated = len(rows) > QUERY_ROW_LIMIT and limit_query(query) != query
+            if truncated:
+                rows = rows[:QUERY_ROW_LIMIT]
+            if rows:
                 print("\nResults:")
-                for row in results:
-                    print(row)
+                # Format every row into one buffer and write it out in a single call
+                out = io.StringIO()
+                writer = csv.writer(out, lineterminator="\n")
+                writer.writerow(columns)
+                writer.writerows(rows)
+                sys.stdout.write(out.getvalue())
+                if truncated:
+                    print(f"(Showing the first {QUERY_ROW_LIMIT} rows; add a LIMIT to see a different range)")
             else:
                 print("No results found")
+            # Anything but a read may have autocommitted DDL, so have main() re-describe the schema
+            if not is_read_query(query):
+                return True
     
     elif intent == "exit":
         conn.close()
@@ -149,6 +313,8 @@ def handle_intent(intent_data: Dict[str, Any], conn: sqlite3.Connection) -> None
     
     else:
         print("Unknown intent")
+    
+    return False
 
 def main():
     """Main CLI interface."""
@@ -160,14 +326,27 @@ def main():
     print("- Exit (e.g., 'quit' or 'bye')")
     
     conn = get_db_connection()
+    last = (None, None)
+    # Describe the schema once up front; handle_intent reports when it may have changed
+    # (a successful CSV load or any generated statement that is not a read)
+    schema_desc = get_schema_description(conn)
     
     while True:
         try:
             user_input = input("\nWhat would you like to do? ").strip()
+            if not user_input:
+                continue
             
-            # Process all input through natural language understanding
-            intent_data = process_natural_language(user_input, conn)
-            handle_intent(intent_data, conn)
+            if user_input == last[0]:
+                # Replay the previous intent; SQL is still re-run against current data
+                intent_data = {k: v for k, v in last[1].items() if k != "streamed"}
+            else:
+                # Process all input through natural language understanding
+                intent_data = process_natural_language(user_input, conn, schema_desc)
+                if intent_data.get("intent") != "error":
+                    last = (user_input, intent_data)
+            if handle_intent(intent_data, conn):
+                schema_desc = get_schema_description(conn)
             
         except Exception as e:
             print(f"Error: {str(e)}")
@@ -0,0 +1,118 @@
+import json
+import logging
+from typing import Optional, Dict, Any, List
+import numpy as np
+
+class SemanticCache:
+    """LRU cache of intent responses keyed on a local embedding of the question."""
+
+    def __init__(self, embedder: Any = None, path: str = 'cache', capacity: int = 512,
+                 threshold: float = 0.92):
+        # Embeddings live in <path>.npy and everything else in <path>.json
+        self.embedder = embedder
+        self.path = path
+        self.capacity = capacity
+        self.threshold = threshold
+        self._embeddings: Optional[np.ndarray] = None
+        self._questions: List[str] = []
+        self._hashes = np.array([], dtype=object)
+        self._intents: List[Dict[str, Any]] = []
+        # Last-use tick per slot; LRU order is tracked here so hits leave the matrix alone
+        self._last_used: List[int] = []
+        self._tick = 0
+        self._dirty = False
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self._questions)
+
+    def load(self) -> None:
+        """Restore cached entries from disk, starting empty if the files are missing or invalid."""
+        try:
+            embeddings = np.load(f"{self.path}.npy", allow_pickle=False)
+            with open(f"{self.path}.json", encoding='utf-8') as f:
+                data = json.load(f)
+            if embeddings.ndim != 2 or len(embeddings) != len(data['questions']):
+                raise ValueError("embeddings do not match cached entries")
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Ignoring unreadable semantic cache: {str(e)}")
+            return
+        self._embeddings = embeddings.astype(np.float32)
+        self._questions = data['questions']
+        self._hashes = np.array(data['hashes'], dtype=object)
+        self._intents = data['intents']
+        self._last_used = list(range(len(self._questions)))
+        self._tick = len(self._questions)
+
+    def save(self) -> None:
+        """Persist cached entries to disk if anything changed since the last save."""
+        if not self._dirty or self._embeddings is None:
+            return
+        try:
+            # Entries are written oldest first so the LRU order survives a reload
+            order = sorted(range(len(self._questions)), key=self._last_used.__getitem__)
+            with open(f"{self.path}.json", 'w', encoding='utf-8') as f:
+                json.dump({
+                    'questions': [self._questions[i] for i in order],
+                    'hashes': [str(self._hashes[i]) for i in order],
+                    'intents': [self._intents[i] for i in order]
+                }, f)
+            np.save(f"{self.path}.npy", self._embeddings[order], allow_pickle=False)
+            self._dirty = False
+        except OSError as e:
+            logging.error(f"Could not save semantic cache: {str(e)}")
+
+    def embed(self, text: str) -> Optional[np.ndarray]:
+        """Return a normalized float32 embedding, or None if no embedding model is available."""
+        if self.embedder is None:
+            return None
+        return self.embedder.encode(text, normalize_embeddings=True).astype(np.float32)
+
+    def get(self, embedding: np.ndarray, schema_hash: str) -> Optional[Dict[str, Any]]:
+        """Return the cached intent for the most similar question above the threshold."""
+        if self._embeddings is None:
+            return None
+        # Only questions asked against the same schema are candidates
+        sims = np.where(self._hashes == schema_hash, self._embeddings @ embedding, -1.0)
+        best = int(np.argmax(sims))
+        if sims[best] < self.threshold:
+            return None
+        self._touch(best)
+        return self._intents[best]
+
+    def put(self, question: str, embedding: np.ndarray, schema_hash: str,
+            intent_data: Dict[str, Any]) -> None:
+        """Store an intent response, evicting the least recently used entry when full."""
+        slot = self._find(question, schema_hash)
+        if slot is None and len(self) >= self.capacity:
+            slot = min(range(len(self)), key=self._last_used.__getitem__)
+        if slot is None:
+            # New slot: the only case that reallocates the embedding matrix
+            row = embedding.reshape(1, -1).astype(np.float32)
+            self._embeddings = row if self._embeddings is None else np.vstack([self._embeddings, row])
+            self._questions.append(question)
+            self._hashes = np.append(self._hashes, np.array([schema_hash], dtype=object))
+            self._intents.append(intent_data)
+            self._last_used.append(0)
+            slot = len(self) - 1
+        else:
+            self._embeddings[slot] = embedding
+            self._questions[slot] = question
+            self._hashes[slot] = schema_hash
+            self._intents[slot] = intent_data
+        self._touch(slot)
+        self._dirty = True
+
+    def _find(self, question: str, schema_hash: str) -> Optional[int]:
+        """Return the slot already holding this question for this schema, if any."""
+        for i, (q, h) in enumerate(zip(self._questions, self._hashes)):
+            if q == question and h == schema_hash:
+                return i
+        return None
+
+    def _touch(self, slot: int) -> None:
+        """Mark a slot as most recently used."""
+        self._tick += 1
+        self._last_used[slot] = self._tick
@@ -0,0 +1,77 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from semantic_cache import SemanticCache
+
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class SemanticCacheTest(unittest.TestCase):
+    """Similarity lookup, LRU eviction and persistence of the semantic cache."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'cache')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_hit_above_threshold_only(self):
+        cache = SemanticCache(path=self.path)
+        cache.put('show tables', unit(1, 0, 0), 'h1', {'intent': 'list_tables'})
+        self.assertEqual(cache.get(unit(1, 0.1, 0), 'h1'), {'intent': 'list_tables'})
+        self.assertIsNone(cache.get(unit(0, 1, 0), 'h1'))
+
+    def test_schema_hash_must_match(self):
+        cache = SemanticCache(path=self.path)
+        cache.put('q', unit(1, 0, 0), 'h1', {'intent': 'a'})
+        cache.put('q', unit(1, 0, 0), 'h2', {'intent': 'b'})
+        self.assertEqual(cache.get(unit(1, 0, 0), 'h2'), {'intent': 'b'})
+        self.assertIsNone(cache.get(unit(1, 0, 0), 'h3'))
+
+    def test_hit_does_not_rebuild_matrix(self):
+        cache = SemanticCache(path=self.path)
+        cache.put('q', unit(1, 0, 0), 'h', {'intent': 'a'})
+        matrix = cache._embeddings
+        cache.get(unit(1, 0, 0), 'h')
+        self.assertIs(cache._embeddings, matrix)
+
+    def test_evicts_least_recently_used(self):
+        cache = SemanticCache(path=self.path, capacity=2)
+        cache.put('a', unit(1, 0, 0), 'h', {'intent': 'a'})
+        cache.put('b', unit(0, 1, 0), 'h', {'intent': 'b'})
+        cache.get(unit(1, 0, 0), 'h')
+        cache.put('c', unit(0, 0, 1), 'h', {'intent': 'c'})
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get(unit(1, 0, 0), 'h'), {'intent': 'a'})
+        self.assertIsNone(cache.get(unit(0, 1, 0), 'h'))
+        self.assertEqual(cache.get(unit(0, 0, 1), 'h'), {'intent': 'c'})
+
+    def test_round_trips_through_disk(self):
+        cache = SemanticCache(path=self.path)
+        cache.put('q', unit(1, 0, 0), 'h', {'intent': 'generate_sql', 'query': 'SELECT 1'})
+        cache.save()
+        restored = SemanticCache(path=self.path)
+        self.assertEqual(restored.get(unit(1, 0, 0), 'h'), {'intent': 'generate_sql', 'query': 'SELECT 1'})
+
+    def test_unreadable_files_start_empty(self):
+        with open(f"{self.path}.json", 'w') as f:
+            f.write('not json')
+        np.save(f"{self.path}.npy", np.zeros((1, 3), dtype=np.float32))
+        self.assertEqual(len(SemanticCache(path=self.path)), 0)
+
+    def test_without_embedder(self):
+        self.assertIsNone(SemanticCache(path=self.path).embed('anything'))
+
+
+if __name__ == '__main__':
+    unittest.main()
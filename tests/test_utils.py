@@ -0,0 +1,154 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import load_csv_arrow, load_csv_stream, pacsv, dedupe_header, execute_query, is_read_query, limit_query, QUERY_ROW_LIMIT
+
+
+class LoadCsvStreamTest(unittest.TestCase):
+    """Loading awkward but ordinary CSV files with the stdlib loader."""
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:', isolation_level=None)
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmpdir.cleanup()
+
+    def load(self, name: str, content: str, encoding: str = 'utf-8'):
+        path = os.path.join(self.tmpdir.name, f"{name}.csv")
+        with open(path, 'w', newline='', encoding=encoding) as f:
+            f.write(content)
+        load_csv_stream(self.conn, path, name)
+        columns = [row[1] for row in self.conn.execute(f'PRAGMA table_info("{name}")')]
+        rows = self.conn.execute(f'SELECT * FROM "{name}"').fetchall()
+        return columns, rows
+
+    def test_trailing_blank_line(self):
+        columns, rows = self.load('tail', 'a,b\n1,2\n3,4\n\n')
+        self.assertEqual(columns, ['a', 'b'])
+        self.assertEqual(rows, [(1, 2), (3, 4)])
+
+    def test_ragged_rows(self):
+        columns, rows = self.load('rag', 'a,b\n1\n2,3,4\n')
+        self.assertEqual(columns, ['a', 'b'])
+        self.assertEqual(rows, [(1, None), (2, 3)])
+
+    def test_duplicate_header(self):
+        columns, rows = self.load('dup', 'a,a,a.1\n1,2,3\n')
+        self.assertEqual(columns, ['a', 'a.1', 'a.1.1'])
+        self.assertEqual(rows, [(1, 2, 3)])
+
+    def test_byte_order_mark(self):
+        columns, rows = self.load('bom', 'id,name\n1,x\n', encoding='utf-8-sig')
+        self.assertEqual(columns, ['id', 'name'])
+        self.assertEqual(rows, [(1, 'x')])
+
+    def test_dedupe_header(self):
+        self.assertEqual(dedupe_header(['a', 'a', 'a']), ['a', 'a.1', 'a.2'])
+
+
+@unittest.skipUnless(pacsv, 'PyArrow is not installed')
+class LoadCsvArrowTest(unittest.TestCase):
+    """The PyArrow loader stores a file exactly like the csv-module loader."""
+
+    CONTENT = (
+        '\ufeffid,flag,missing,when,score,dup,dup\n'
+        '1,true,NA,2024-01-01T10:00:00,1.5,a,b\n'
+        '2,false,,2024-01-02T11:30:00,,"",c\n'
+        '3,TRUE,N/A,not a date,2,d,e\n'
+        '\n'
+    )
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def load(self, loader, content: str):
+        path = os.path.join(self.tmpdir.name, 'data.csv')
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            f.write(content)
+        conn = sqlite3.connect(':memory:', isolation_level=None)
+        loader(conn, path, 'data')
+        schema = conn.execute('PRAGMA table_info("data")').fetchall()
+        # Compare Python types too, so 1 vs '1' or 1 vs 1.0 counts as a difference
+        rows = [[(value, type(value)) for value in row]
+                for row in conn.execute('SELECT * FROM "data"')]
+        conn.close()
+        return schema, rows
+
+    def test_matches_stream_loader(self):
+        self.assertEqual(self.load(load_csv_arrow, self.CONTENT),
+                         self.load(load_csv_stream, self.CONTENT))
+
+    def test_late_non_numeric_value_matches(self):
+        content = 'n\n' + '1\n' * 200 + 'N/A\n'
+        self.assertEqual(self.load(load_csv_arrow, content), self.load(load_csv_stream, content))
+
+    def test_ragged_rows_fall_back(self):
+        content = 'a,b\n1\n2,3,4\n'
+        self.assertEqual(self.load(load_csv_arrow, content), self.load(load_csv_stream, content))
+
+
+class LimitQueryTest(unittest.TestCase):
+    """Capping SELECT results without breaking the statement."""
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:', isolation_level=None)
+        self.conn.execute('CREATE TABLE t (id INTEGER, note TEXT)')
+        self.conn.executemany('INSERT INTO t VALUES (?, ?)', [(i, '--x') for i in range(1500)])
+
+    def tearDown(self):
+        self.conn.close()
+
+    def count(self, query: str) -> int:
+        return len(execute_query(self.conn, query)[1])
+
+    def test_caps_plain_select(self):
+        self.assertEqual(self.count('SELECT * FROM t'), QUERY_ROW_LIMIT + 1)
+
+    def test_trailing_semicolon_and_comment(self):
+        self.assertEqual(self.count('SELECT * FROM t; -- note'), QUERY_ROW_LIMIT + 1)
+        self.assertEqual(self.count('SELECT * FROM t -- all rows'), QUERY_ROW_LIMIT + 1)
+
+    def test_leading_comment(self):
+        query = '-- note\nSELECT * FROM t'
+        self.assertTrue(is_read_query(query))
+        self.assertEqual(self.count(query), QUERY_ROW_LIMIT + 1)
+
+    def test_existing_limit_kept(self):
+        query = 'SELECT * FROM t LIMIT 5'
+        self.assertEqual(limit_query(query), query)
+        self.assertEqual(self.count(query), 5)
+
+    def test_subquery_limit_still_capped(self):
+        self.assertEqual(self.count('SELECT * FROM t WHERE id IN (SELECT id FROM t LIMIT 1200)'),
+                         QUERY_ROW_LIMIT + 1)
+
+    def test_comment_marker_inside_string(self):
+        self.assertEqual(self.count("SELECT * FROM t WHERE note = '--x'"), QUERY_ROW_LIMIT + 1)
+
+    def test_with_select_is_read(self):
+        self.assertTrue(is_read_query('WITH x AS (SELECT id FROM t) SELECT * FROM x'))
+
+    def test_with_delete_not_wrapped(self):
+        query = 'WITH x AS (SELECT id FROM t WHERE id < 10) DELETE FROM t WHERE id IN x'
+        self.assertFalse(is_read_query(query))
+        self.assertEqual(limit_query(query), query)
+        execute_query(self.conn, query)
+        self.assertEqual(self.conn.execute('SELECT COUNT(*) FROM t').fetchone()[0], 1490)
+
+    def test_duplicate_column_names_kept(self):
+        columns, _ = execute_query(self.conn, 'SELECT a.id, b.id FROM t a JOIN t b ON a.id = b.id')
+        self.assertEqual(columns, ['id', 'id'])
+
+
+if __name__ == '__main__':
+    unittest.main()
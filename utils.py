@@ -1,8 +1,17 @@
 import sqlite3
-import pandas as pd
+import csv
+import re
+import itertools
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:  # PyArrow is optional; CSV loads fall back to the csv module
+    pa = pacsv = None
 import logging
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple, Iterable, Sequence
 import os
+from urllib.parse import quote
 from datetime import datetime
 
 # Set up logging
@@ -12,89 +21,273 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-def get_db_connection(db_name: str = 'spreadsheet.db') -> sqlite3.Connection:
+# Rows per record batch when converting PyArrow tables
+CSV_CHUNK_SIZE = 10_000
+
+# Rows packed into one multi-row INSERT statement
+INSERT_ROWS_PER_STATEMENT = 500
+
+# Bound-parameter limit per statement (SQLITE_MAX_VARIABLE_NUMBER default)
+MAX_SQL_VARIABLES = 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999
+
+# Rows sampled from the top of a CSV file to infer column types
+SCHEMA_SAMPLE_ROWS = 100
+
+# Maximum rows returned for a query that has no LIMIT of its own
+QUERY_ROW_LIMIT = 1000
+# Comments and quoted strings/identifiers, matched together so a "--" inside a string isn't a comment
+_SQL_SKIP_RE = re.compile(
+    r"--[^\n]*|/\*.*?(?:\*/|\Z)|'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\]",
+    re.S
+)
+_SQL_WORD_RE = re.compile(r"\(|\)|\w+")
+# Statement keywords that can follow a WITH clause
+_SQL_VERBS = {'select', 'insert', 'replace', 'update', 'delete', 'values'}
+
+# Compiled statements kept per connection by the sqlite3 module
+STATEMENT_CACHE_SIZE = 256
+
+# Fixed SQL text so each statement is compiled once and reused from the statement cache
+TABLE_EXISTS_SQL = "SELECT name FROM sqlite_master WHERE type='table' AND name=?"
+TABLE_SCHEMA_SQL = "SELECT name, type FROM pragma_table_info(?) ORDER BY cid"
+LIST_TABLES_SQL = "SELECT name FROM sqlite_master WHERE type='table'"
+
+def get_db_connection(db_name: str = 'spreadsheet.db', shared: bool = True) -> sqlite3.Connection:
     """Create and return a database connection."""
-    return sqlite3.connect(db_name)
-
-def infer_schema(df: pd.DataFrame) -> Dict[str, str]:
-    """Infer SQLite schema from pandas DataFrame."""
-    type_mapping = {
-        'object': 'TEXT',
-        'int64': 'INTEGER',
-        'float64': 'REAL',
-        'datetime64[ns]': 'TEXT'
-    }
-    
-    schema = {}
-    for column in df.columns:
-        dtype = str(df[column].dtype)
-        schema[column] = type_mapping.get(dtype, 'TEXT')
-    return schema
+    # Shared-cache connection; sqlite3 keeps compiled statements keyed on SQL text.
+    # isolation_level=None means autocommit: any statement not wrapped in an explicit
+    # BEGIN/COMMIT (including UPDATE/DELETE/DDL from generated SQL) is committed at once.
+    database = f"file:{quote(db_name)}?cache=shared" if shared else f"file:{quote(db_name)}"
+    conn = sqlite3.connect(database, uri=True, isolation_level=None,
+                           cached_statements=STATEMENT_CACHE_SIZE)
+    # WAL + NORMAL keeps fsyncs off the insert path; mmap and a 64MB page cache speed up reads
+    conn.executescript("""
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=NORMAL;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA cache_size=-65536;
+        PRAGMA mmap_size=268435456;
+    """)
+    return conn
+
+def infer_column_type(values: List[Optional[str]]) -> str:
+    """Infer the SQLite type of a CSV column from a sample of its values."""
+    present = [value for value in values if value is not None]
+    if not present:
+        return 'TEXT'
+    for cast, sql_type in ((int, 'INTEGER'), (float, 'REAL')):
+        try:
+            for value in present:
+                cast(value)
+            return sql_type
+        except ValueError:
+            continue
+    return 'TEXT'
+
+def dedupe_header(header: List[str]) -> List[str]:
+    """Rename repeated column names to name.1, name.2, ... as pandas does."""
+    seen = set()
+    names = []
+    for name in header:
+        candidate, counter = name, 0
+        while candidate in seen:
+            counter += 1
+            candidate = f"{name}.{counter}"
+        seen.add(candidate)
+        names.append(candidate)
+    return names
+
+def infer_csv_schema(header: List[str], sample: List[List[Optional[str]]]) -> Dict[str, str]:
+    """Infer SQLite schema from a CSV header and a sample of its rows."""
+    columns = zip(*sample) if sample else [()] * len(header)
+    return {name: infer_column_type(list(values)) for name, values in zip(header, columns)}
+
+def quote_identifier(ident: str) -> str:
+    """Quote a table or column name for safe interpolation into SQL."""
+    return '"' + ident.replace('"', '""') + '"'
 
 def create_table_sql(table_name: str, schema: Dict[str, str]) -> str:
     """Generate CREATE TABLE SQL statement."""
-    columns = [f"{col} {dtype}" for col, dtype in schema.items()]
-    return f"CREATE TABLE IF NOT EXISTS {table_name} ({', '.join(columns)})"
+    columns = [f"{quote_identifier(col)} {dtype}" for col, dtype in schema.items()]
+    return f"CREATE TABLE IF NOT EXISTS {quote_identifier(table_name)} ({', '.join(columns)})"
 
 def table_exists(conn: sqlite3.Connection, table_name: str) -> bool:
     """Check if a table exists in the database."""
-    cursor = conn.cursor()
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
+    cursor = conn.execute(TABLE_EXISTS_SQL, (table_name,))
     return cursor.fetchone() is not None
 
 def get_table_schema(conn: sqlite3.Connection, table_name: str) -> List[Dict]:
     """Get schema information for a table."""
-    cursor = conn.cursor()
-    cursor.execute(f"PRAGMA table_info({table_name})")
-    return [{'name': row[1], 'type': row[2]} for row in cursor.fetchall()]
+    cursor = conn.execute(TABLE_SCHEMA_SQL, (table_name,))
+    return [{'name': row[0], 'type': row[1]} for row in cursor.fetchall()]
 
-def load_csv_to_db(csv_path: str, table_name: Optional[str] = None) -> bool:
-    """Load CSV file into SQLite database with schema inference."""
+def insert_rows(conn: sqlite3.Connection, table_name: str, num_columns: int,
+                rows: Iterable[Sequence]) -> None:
+    """Insert rows using multi-row INSERT statements."""
+    # Keep each statement under SQLite's bound-parameter limit
+    chunk_size = max(1, min(INSERT_ROWS_PER_STATEMENT, MAX_SQL_VARIABLES // num_columns))
+    row_placeholder = "(" + ",".join("?" * num_columns) + ")"
+    insert_sql = f"INSERT INTO {quote_identifier(table_name)} VALUES {','.join([row_placeholder] * chunk_size)}"
+    
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            break
+        if len(chunk) < chunk_size:
+            # Trailing partial chunk needs its own, shorter statement
+            insert_sql = f"INSERT INTO {quote_identifier(table_name)} VALUES {','.join([row_placeholder] * len(chunk))}"
+        conn.execute(insert_sql, list(itertools.chain.from_iterable(chunk)))
+
+def load_csv_arrow(conn: sqlite3.Connection, csv_path: str, table_name: str) -> None:
+    """Parse a CSV file with PyArrow and insert it into a new table."""
+    # Read the header ourselves so names are de-duplicated exactly as in load_csv_stream
+    with open(csv_path, newline='', encoding='utf-8-sig') as f:
+        header = dedupe_header(next(csv.reader(f)))
+    
     try:
-        # Read CSV file
-        df = pd.read_csv(csv_path)
+        # Arrow only does the (multithreaded) parsing: every column stays a string and
+        # only empty fields become NULL, so typing and storage match load_csv_stream
+        table = pacsv.read_csv(
+            csv_path,
+            read_options=pacsv.ReadOptions(block_size=1 << 20, column_names=header, skip_rows=1),
+            convert_options=pacsv.ConvertOptions(
+                column_types={name: pa.string() for name in header},
+                null_values=[''],
+                strings_can_be_null=True
+            )
+        )
+    except pa.ArrowInvalid as e:
+        # e.g. a ragged row; the csv module pads or trims those instead of failing
+        logging.warning(f"PyArrow could not parse {csv_path}, falling back: {str(e)}")
+        load_csv_stream(conn, csv_path, table_name)
+        return
+    
+    # Infer types from the same leading sample the csv loader uses
+    sample = [list(row) for row in zip(*(column.to_pylist() for column in table.slice(0, SCHEMA_SAMPLE_ROWS).columns))]
+    conn.execute(create_table_sql(table_name, infer_csv_schema(header, sample)))
+    
+    rows = itertools.chain.from_iterable(
+        zip(*(column.to_pylist() for column in batch.columns))
+        for batch in table.to_batches(max_chunksize=CSV_CHUNK_SIZE)
+    )
+    insert_rows(conn, table_name, len(header), rows)
+
+def load_csv_stream(conn: sqlite3.Connection, csv_path: str, table_name: str) -> None:
+    """Stream a CSV file with the csv module and insert it into a new table."""
+    # utf-8-sig strips the byte-order mark that Excel puts on exported files
+    with open(csv_path, newline='', encoding='utf-8-sig') as f:
+        # Stream the file; only the type-inference sample is held up front
+        reader = csv.reader(f)
+        header = dedupe_header(next(reader))
+        width = len(header)
+        # Skip blank lines and pad or trim ragged rows to the header width
+        rows = (
+            [value if value != '' else None
+             for value in itertools.islice(itertools.chain(row, itertools.repeat('')), width)]
+            for row in reader if row
+        )
+        sample = list(itertools.islice(rows, SCHEMA_SAMPLE_ROWS))
         
+        # Infer schema and create table
+        schema = infer_csv_schema(header, sample)
+        conn.execute(create_table_sql(table_name, schema))
+        
+        # Insert data, sample rows first
+        insert_rows(conn, table_name, width, itertools.chain(sample, rows))
+
+def load_csv_to_db(csv_path: str, table_name: Optional[str] = None,
+                   conn: Optional[sqlite3.Connection] = None) -> bool:
+    """Load CSV file into SQLite database with schema inference."""
+    owns_conn = conn is None
+    try:
         # Generate table name if not provided
         if not table_name:
             table_name = os.path.splitext(os.path.basename(csv_path))[0]
         
-        # Get database connection
-        conn = get_db_connection()
+        # Reuse the caller's connection when given one
+        if owns_conn:
+            conn = get_db_connection()
         
         # Check if table exists
         if table_exists(conn, table_name):
             logging.warning(f"Table {table_name} already exists")
             return False
         
-        # Infer schema and create table
-        schema = infer_schema(df)
-        create_sql = create_table_sql(table_name, schema)
-        conn.execute(create_sql)
-        
-        # Insert data
-        df.to_sql(table_name, conn, if_exists='append', index=False)
-        conn.commit()
-        conn.close()
+        # Create and fill the table in one explicit transaction
+        conn.execute("BEGIN")
+        try:
+            # Prefer PyArrow's multithreaded parser when it is installed
+            if pacsv is not None:
+                load_csv_arrow(conn, csv_path, table_name)
+            else:
+                load_csv_stream(conn, csv_path, table_name)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
         return True
         
     except Exception as e:
         logging.error(f"Error loading CSV: {str(e)}")
         return False
 
-def execute_query(conn: sqlite3.Connection, query: str) -> List[Dict]:
-    """Execute SQL query and return results as list of dictionaries."""
+    finally:
+        if owns_conn and conn is not None:
+            conn.close()
+
+def strip_sql(query: str) -> str:
+    """Remove comments and surrounding whitespace and semicolons from an SQL statement."""
+    def replace(match):
+        token = match.group(0)
+        return ' ' if token.startswith(('--', '/*')) else token
+    return _SQL_SKIP_RE.sub(replace, query).strip().strip(';').strip()
+
+def top_level_words(query: str) -> List[str]:
+    """Return the lowercased keywords and names of a comment-free statement that sit outside parentheses."""
+    masked = _SQL_SKIP_RE.sub(' ', query)
+    words = []
+    depth = 0
+    for match in _SQL_WORD_RE.finditer(masked):
+        token = match.group(0)
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif depth == 0:
+            words.append(token.lower())
+    return words
+
+def is_read_query(query: str) -> bool:
+    """Return True if the query is a SELECT (or WITH ... SELECT) that cannot modify the database."""
+    words = top_level_words(strip_sql(query))
+    if not words:
+        return False
+    if words[0] == 'with':
+        # CTE bodies are parenthesized, so the first top-level verb is the real statement
+        return next((word for word in words if word in _SQL_VERBS), None) == 'select'
+    return words[0] == 'select'
+
+def limit_query(query: str) -> str:
+    """Add LIMIT QUERY_ROW_LIMIT + 1 to a SELECT without its own LIMIT; the extra row flags truncation."""
+    cleaned = strip_sql(query)
+    if not is_read_query(cleaned) or 'limit' in top_level_words(cleaned):
+        return query
+    # Appending (rather than wrapping in a subquery) keeps duplicate column names intact
+    return f"{cleaned} LIMIT {QUERY_ROW_LIMIT + 1}"
+
+def execute_query(conn: sqlite3.Connection, query: str) -> Tuple[List[str], List[tuple]]:
+    """Execute SQL query and return the column names and result rows as tuples."""
     try:
-        cursor = conn.cursor()
-        cursor.execute(query)
-        columns = [description[0] for description in cursor.description]
-        results = cursor.fetchall()
-        return [dict(zip(columns, row)) for row in results]
+        cursor = conn.execute(limit_query(query))
+        # Statements that return no rows (UPDATE, CREATE, ...) have no description
+        columns = [description[0] for description in cursor.description or []]
+        return columns, cursor.fetchall()
     except Exception as e:
         logging.error(f"Error executing query: {str(e)}")
-        return []
+        return [], []
 
 def list_tables(conn: sqlite3.Connection) -> List[str]:
     """List all tables in the database."""
-    cursor = conn.cursor()
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    cursor = conn.execute(LIST_TABLES_SQL)
     return [row[0] for row in cursor.fetchall()] 
\ No newline at end of file